@@ -5,13 +5,17 @@ from flask_jwt_extended import (
 )
 import bcrypt
 from db import get_connection
+from order_items import ensure_schema as ensure_order_items_schema
+from order_journal import OrderJournal, validate_order
+from product_search import ProductIndex, row_to_product, DEFAULT_LIMIT, MAX_LIMIT
 import os
 from dotenv import load_dotenv
-from datetime import timedelta
+from datetime import datetime, timedelta
 from psycopg2.errors import UniqueViolation
 import random, string
 from werkzeug.utils import secure_filename
 import json
+import queue
 from flask_socketio import SocketIO, emit
 
 load_dotenv()
@@ -282,14 +286,17 @@ def add_product():
         cur.execute("""
             INSERT INTO products (name, category, image, size, addons)
             VALUES (%s, %s, %s, %s, %s)
-            RETURNING id
+            RETURNING id, name, category, image, size, addons
         """, (name, category, filename, json.dumps(size), json.dumps(addons)))
 
-        product_id = cur.fetchone()[0]
+        row = cur.fetchone()
+        product_id = row[0]
         conn.commit()
         cur.close()
         conn.close()
 
+        product_index.add(row_to_product(row))
+
         return jsonify({"message": "Product added successfully", "id": product_id}), 201
 
     except Exception as e:
@@ -310,33 +317,7 @@ def get_products():
         cur.close()
         conn.close()
 
-        products = []
-        for r in rows:
-            # Safely parse JSON fields if they're text
-            size = r[4]
-            addons = r[5]
-
-            # Handle cases where DB returns strings instead of dict/list
-            if isinstance(size, str):
-                try:
-                    size = json.loads(size)
-                except:
-                    pass
-
-            if isinstance(addons, str):
-                try:
-                    addons = json.loads(addons)
-                except:
-                    pass
-
-            products.append({
-                "id": r[0],
-                "name": r[1],
-                "category": r[2],
-                "image": r[3],
-                "size": size,
-                "addons": addons,
-            })
+        products = [row_to_product(r) for r in rows]
 
         return jsonify(products), 200
 
@@ -344,6 +325,27 @@ def get_products():
         print("Error in /api/products (GET):", e)
         return jsonify({"error": str(e)}), 500
 
+# ---------------- SEARCH PRODUCTS ----------------
+product_index = ProductIndex()
+
+@app.route("/api/products/search", methods=["GET"])
+@jwt_required()
+def search_products():
+    try:
+        query = request.args.get("q", "")
+        category = request.args.get("category")
+        try:
+            limit = int(request.args.get("limit", DEFAULT_LIMIT))
+        except ValueError:
+            return jsonify({"error": "limit must be a number"}), 400
+        limit = max(1, min(limit, MAX_LIMIT))
+
+        return jsonify(product_index.search(query, category=category, limit=limit)), 200
+
+    except Exception as e:
+        print("Error in /api/products/search:", e)
+        return jsonify({"error": str(e)}), 500
+
 from flask import send_from_directory
 
 @app.route("/uploads/<path:filename>")
@@ -410,6 +412,8 @@ def update_category(name):
         if not updated:
             return jsonify({"error": "Category not found"}), 404
 
+        product_index.reload_category(name, new_name)
+
         return jsonify({"message": "Category updated", "category": updated[0]}), 200
 
     except Exception as e:
@@ -421,10 +425,13 @@ def update_category(name):
 def delete_category(id):
     conn = get_connection()
     cur = conn.cursor()
-    cur.execute("DELETE FROM categories WHERE id = %s", (id,))
+    cur.execute("DELETE FROM categories WHERE id = %s RETURNING name", (id,))
+    deleted = cur.fetchone()
     conn.commit()
     cur.close()
     conn.close()
+    if deleted:
+        product_index.reload_category(deleted[0])
     return jsonify({"message": "Category deleted"})
 
 
@@ -664,34 +671,143 @@ def get_orders():
 
 socketio = SocketIO(app, cors_allowed_origins="*")
 
+
+# The journal writer runs in a native thread; its flushed orders are handed
+# over here and emitted from a SocketIO background task so delivery works
+# under eventlet too.
+flushed_orders = queue.Queue()
+
+def emit_flushed_orders():
+    while True:
+        while True:
+            try:
+                seq, order_id = flushed_orders.get_nowait()
+            except queue.Empty:
+                break
+            # 🔥 Emit event to all clients once the order has reached the database
+            socketio.emit("new_order", {"order_id": order_id, "journal_seq": seq, "message": "New order added"})
+        socketio.sleep(0.2)
+
+order_journal = OrderJournal(on_flushed=lambda seq, order_id: flushed_orders.put((seq, order_id)))
+
 @app.route("/api/orders", methods=["POST"])
 def add_order():
-    data = request.get_json()
+    try:
+        data = request.get_json(force=True)
 
-    conn = get_connection()
-    cur = conn.cursor()
+        error = validate_order(data)
+        if error:
+            return jsonify({"error": error}), 400
 
-    cur.execute("""
-        INSERT INTO orders (customer_name, "paymentMethod", items, "totalAmount", status)
-        VALUES (%s, %s, %s, %s, %s)
-        RETURNING id
-    """, (
-        f"Customer #{data['customerNumber']}",
-        data['paymentMethod'],
-        json.dumps(data['items']),
-        data['totalAmount'],
-        data['status']
-    ))
+        # Acknowledged once it is fsync'd to the local journal; the background
+        # writer copies it to Postgres.
+        seq = order_journal.append(data)
+
+        return jsonify({"message": "Order accepted", "journal_seq": seq}), 202
+
+    except Exception as e:
+        print("Error in /api/orders (POST):", e)
+        return jsonify({"error": str(e)}), 500
+
+
+# ---------------- ORDER JOURNAL STATUS ----------------
+@app.route("/api/orders/journal", methods=["GET"])
+def get_order_journal_status():
+    return jsonify(order_journal.status()), 200
+
+@app.route("/api/orders/journal/<int:seq>", methods=["GET"])
+def get_order_journal_entry(seq):
+    entry = order_journal.lookup(seq)
+    if not entry:
+        return jsonify({"error": "Journal entry not found"}), 404
+    return jsonify(entry), 200
+
+@app.route("/api/orders/journal/failed", methods=["GET"])
+def get_failed_journal_entries():
+    return jsonify(order_journal.failed()), 200
+
+@app.route("/api/orders/journal/failed/retry", methods=["POST"])
+def retry_failed_journal_entries():
+    return jsonify({"requeued": order_journal.retry()}), 200
+
+@app.route("/api/orders/journal/<int:seq>/retry", methods=["POST"])
+def retry_journal_entry(seq):
+    if not order_journal.retry(seq):
+        return jsonify({"error": "No failed journal entry with that seq"}), 404
+    return jsonify({"requeued": 1}), 200
+
+# ---------------- ITEM SALES REPORT ----------------
+@app.route("/api/reports/item-sales", methods=["GET"])
+def get_item_sales():
+    try:
+        try:
+            since = request.args.get("since")
+            until = request.args.get("until")
+            since = datetime.fromisoformat(since) if since else None
+            until = datetime.fromisoformat(until) if until else None
+        except ValueError:
+            return jsonify({"error": "since and until must be ISO dates, e.g. 2026-10-19"}), 400
+
+        date_filter = ""
+        params = []
+        if since:
+            date_filter += ' AND o."date" >= %s'
+            params.append(since)
+        if until:
+            date_filter += ' AND o."date" < %s'
+            params.append(until)
+
+        conn = get_connection()
+        cur = conn.cursor()
+        cur.execute(f"""
+            SELECT oi.product_name, oi.size, SUM(oi.quantity), SUM(oi.quantity * oi.unit_price)
+            FROM order_items oi
+            JOIN orders o ON o.id = oi.order_id
+            WHERE TRUE{date_filter}
+            GROUP BY oi.product_name, oi.size
+            ORDER BY SUM(oi.quantity) DESC
+        """, params)
+        products = cur.fetchall()
+
+        cur.execute(f"""
+            SELECT a.name, SUM(oi.quantity), SUM(oi.quantity * a.price)
+            FROM order_item_addons a
+            JOIN order_items oi ON oi.id = a.order_item_id
+            JOIN orders o ON o.id = oi.order_id
+            WHERE TRUE{date_filter}
+            GROUP BY a.name
+            ORDER BY SUM(oi.quantity) DESC
+        """, params)
+        addons = cur.fetchall()
+        cur.close()
+        conn.close()
+
+        return jsonify({
+            "products": [
+                {"name": r[0], "size": r[1], "quantity": int(r[2]), "revenue": float(r[3])}
+                for r in products
+            ],
+            "addons": [
+                {"name": r[0], "quantity": int(r[1]), "revenue": float(r[2])}
+                for r in addons
+            ],
+        }), 200
+
+    except Exception as e:
+        print("Error in /api/reports/item-sales:", e)
+        return jsonify({"error": str(e)}), 500
 
-    conn.commit()
-    order_id = cur.fetchone()[0]
-    cur.close()
-    conn.close()
 
-    # 🔥 Emit event to all clients that a new order was added
-    socketio.emit("new_order", {"order_id": order_id, "message": "New order added"})
+try:
+    _conn = get_connection()
+    ensure_order_items_schema(_conn)
+    _conn.close()
+except Exception as e:
+    print("Could not create order_items tables:", e)
 
-    return jsonify({"message": "Order added successfully", "order_id": order_id}), 201
+# Replays anything left in the journal by a previous run, then keeps flushing
+order_journal.start()
+socketio.start_background_task(emit_flushed_orders)
 
 if __name__ == "__main__":
     port = int(os.getenv("PORT", 5000))
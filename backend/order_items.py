@@ -0,0 +1,127 @@
+import json
+import psycopg2
+from psycopg2.extras import execute_values
+from db import get_connection
+
+# Order lines used to live only inside the orders.items JSON blob. They are now
+# also written to these tables so item-level reporting can use indexed SQL.
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS order_items (
+    id SERIAL PRIMARY KEY,
+    order_id INTEGER NOT NULL REFERENCES orders(id) ON DELETE CASCADE,
+    line_no INTEGER NOT NULL,
+    product_name TEXT NOT NULL,
+    size TEXT,
+    quantity INTEGER NOT NULL DEFAULT 1,
+    unit_price NUMERIC(10, 2) NOT NULL DEFAULT 0,
+    UNIQUE (order_id, line_no)
+);
+CREATE INDEX IF NOT EXISTS idx_order_items_product ON order_items (product_name, size);
+-- The item-sales report filters on the order date
+CREATE INDEX IF NOT EXISTS idx_orders_date ON orders ("date");
+
+CREATE TABLE IF NOT EXISTS order_item_addons (
+    id SERIAL PRIMARY KEY,
+    order_item_id INTEGER NOT NULL REFERENCES order_items(id) ON DELETE CASCADE,
+    name TEXT NOT NULL,
+    price NUMERIC(10, 2) NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS idx_order_item_addons_item ON order_item_addons (order_item_id);
+CREATE INDEX IF NOT EXISTS idx_order_item_addons_name ON order_item_addons (name);
+"""
+
+
+def ensure_schema(conn):
+    cur = conn.cursor()
+    cur.execute(SCHEMA)
+    conn.commit()
+    cur.close()
+
+
+def insert_order_items(cur, order_id, items):
+    """Write the cart lines of one order. Runs on the caller's cursor so the
+    lines commit (or roll back) together with the order itself."""
+    if isinstance(items, str):
+        items = json.loads(items)
+    if not items:
+        return
+
+    lines = [
+        (
+            order_id,
+            line_no,
+            item.get("productName") or item.get("name") or "",
+            item.get("size"),
+            int(item.get("qty") or item.get("quantity") or 1),
+            item.get("price") or 0,
+        )
+        for line_no, item in enumerate(items)
+    ]
+    line_ids = execute_values(cur, """
+        INSERT INTO order_items (order_id, line_no, product_name, size, quantity, unit_price)
+        VALUES %s
+        ON CONFLICT (order_id, line_no) DO NOTHING
+        RETURNING id, line_no
+    """, lines, fetch=True)
+
+    # Lines that already existed (ON CONFLICT) are skipped along with their add-ons
+    addon_rows = []
+    for line_id, line_no in line_ids:
+        for addon in items[line_no].get("addons") or []:
+            if isinstance(addon, dict):
+                addon_rows.append((line_id, addon.get("name") or "", addon.get("price") or 0))
+            else:
+                addon_rows.append((line_id, str(addon), 0))
+
+    if addon_rows:
+        execute_values(cur, """
+            INSERT INTO order_item_addons (order_item_id, name, price)
+            VALUES %s
+        """, addon_rows)
+
+
+def backfill(chunk_size=500):
+    """Copy existing orders.items blobs into order_items, one committed chunk
+    at a time. Orders that already have lines are skipped, so it is safe to
+    stop and re-run."""
+    conn = get_connection()
+    ensure_schema(conn)
+    cur = conn.cursor()
+
+    last_id = 0
+    migrated = 0
+    while True:
+        cur.execute("""
+            SELECT o.id, o.items FROM orders o
+            WHERE o.id > %s
+              AND NOT EXISTS (SELECT 1 FROM order_items oi WHERE oi.order_id = o.id)
+            ORDER BY o.id ASC
+            LIMIT %s
+        """, (last_id, chunk_size))
+        rows = cur.fetchall()
+        if not rows:
+            break
+
+        for order_id, items in rows:
+            # A savepoint per order so one blob Postgres rejects doesn't
+            # abort the rest of the chunk
+            cur.execute("SAVEPOINT backfill_order")
+            try:
+                insert_order_items(cur, order_id, items)
+                cur.execute("RELEASE SAVEPOINT backfill_order")
+                migrated += 1
+            except (psycopg2.Error, ValueError, TypeError, AttributeError) as e:
+                cur.execute("ROLLBACK TO SAVEPOINT backfill_order")
+                print(f"Skipping order {order_id} in backfill:", e)
+        conn.commit()
+
+        last_id = rows[-1][0]
+        print(f"Backfilled up to order {last_id} ({migrated} orders)")
+
+    cur.close()
+    conn.close()
+    return migrated
+
+
+if __name__ == "__main__":
+    backfill()
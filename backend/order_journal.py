@@ -0,0 +1,356 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+import psycopg2
+import psycopg2.errors
+from db import get_connection
+from order_items import ensure_schema as ensure_order_items_schema, insert_order_items
+
+# Orders are accepted into a local SQLite journal (WAL, synchronous=FULL, so a
+# commit is fsync'd) and copied to Postgres by a background writer. The
+# cashier no longer waits on Postgres, and a Postgres outage only delays the
+# copy instead of failing the order.
+JOURNAL_PATH = os.getenv(
+    "ORDER_JOURNAL_PATH",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "order_journal.db")
+)
+BATCH_SIZE = 50
+RETRY_MIN = 0.5
+RETRY_MAX = 30
+
+# Errors that mean "try again later" rather than "this order is bad". A
+# missing table means the schema has not been created yet, e.g. because
+# Postgres was down when the backend started.
+RETRYABLE = (psycopg2.OperationalError, psycopg2.InterfaceError, psycopg2.errors.UndefinedTable)
+
+# Records which journal entries already reached Postgres, written in the same
+# transaction as the order so a crash between the Postgres commit and the
+# local "flushed" mark can't insert an order twice on replay. Entries are
+# keyed by a random entry_id, not seq: seq restarts at 1 in a new journal
+# file or on another backend instance.
+PG_SCHEMA = """
+CREATE TABLE IF NOT EXISTS order_journal_applied (
+    entry_id TEXT PRIMARY KEY,
+    order_id INTEGER REFERENCES orders(id) ON DELETE SET NULL
+);
+"""
+
+SQLITE_SCHEMA = """
+CREATE TABLE IF NOT EXISTS journal (
+    seq INTEGER PRIMARY KEY AUTOINCREMENT,
+    entry_id TEXT NOT NULL UNIQUE,
+    payload TEXT NOT NULL,
+    created_at REAL NOT NULL,
+    order_id INTEGER,
+    flushed_at REAL,
+    failed_at REAL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    last_error TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_journal_pending ON journal (seq) WHERE flushed_at IS NULL AND failed_at IS NULL;
+"""
+
+
+def _open(path):
+    conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=FULL")
+    conn.executescript(SQLITE_SCHEMA)
+    return conn
+
+
+def insert_order(cur, data):
+    cur.execute("""
+        INSERT INTO orders (customer_name, "paymentMethod", items, "totalAmount", status)
+        VALUES (%s, %s, %s, %s, %s)
+        RETURNING id
+    """, (
+        f"Customer #{data['customerNumber']}",
+        data['paymentMethod'],
+        json.dumps(data['items']),
+        data['totalAmount'],
+        data['status']
+    ))
+    order_id = cur.fetchone()[0]
+
+    # Normalized order lines go in the same transaction as the order
+    insert_order_items(cur, order_id, data['items'])
+    return order_id
+
+
+def _is_number(value):
+    # Numbers or numeric strings that fit the NUMERIC(10, 2) columns
+    if isinstance(value, bool) or not isinstance(value, (int, float, str)):
+        return False
+    try:
+        return abs(float(value)) < 10 ** 8
+    except ValueError:
+        return False
+
+
+def validate_order(data):
+    """Check an order has everything insert_order needs, so an order that was
+    acknowledged is not rejected later by the writer. Returns an error
+    message, or None if the order is valid."""
+    if not isinstance(data, dict):
+        return "Order must be a JSON object"
+
+    missing = [k for k in ("customerNumber", "paymentMethod", "items", "totalAmount", "status") if k not in data]
+    if missing:
+        return f"Missing required fields: {', '.join(missing)}"
+
+    if not _is_number(data["totalAmount"]):
+        return "totalAmount must be a number"
+
+    items = data["items"]
+    if not isinstance(items, list) or not items:
+        return "items must be a non-empty list"
+
+    for i, item in enumerate(items):
+        if not isinstance(item, dict):
+            return f"items[{i}] must be an object"
+        if not isinstance(item.get("productName"), str) or not item["productName"]:
+            return f"items[{i}].productName is required"
+        qty = item.get("qty")
+        if not isinstance(qty, int) or isinstance(qty, bool) or qty < 1:
+            return f"items[{i}].qty must be a positive integer"
+        if not _is_number(item.get("price")):
+            return f"items[{i}].price must be a number"
+
+        addons = item.get("addons", [])
+        if not isinstance(addons, list):
+            return f"items[{i}].addons must be a list"
+        for addon in addons:
+            if not isinstance(addon, dict) or not _is_number(addon.get("price", 0)):
+                return f"items[{i}].addons must be objects with a numeric price"
+    return None
+
+
+class OrderJournal:
+    def __init__(self, path=JOURNAL_PATH, on_flushed=None):
+        self.path = path
+        self.on_flushed = on_flushed
+        self._conn = _open(path)
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._thread = None
+        self._last_error = None
+        self._last_flush_at = None
+
+    # ---------------- ACCEPT ----------------
+    def append(self, data):
+        """Durably store an order and return its journal sequence number."""
+        with self._lock:
+            cur = self._conn.execute(
+                "INSERT INTO journal (entry_id, payload, created_at) VALUES (?, ?, ?)",
+                (uuid.uuid4().hex, json.dumps(data), time.time())
+            )
+            seq = cur.lastrowid
+        self._wake.set()
+        return seq
+
+    # ---------------- STATUS ----------------
+    def status(self):
+        with self._lock:
+            pending, oldest = self._conn.execute(
+                "SELECT COUNT(*), MIN(created_at) FROM journal WHERE flushed_at IS NULL AND failed_at IS NULL"
+            ).fetchone()
+            failed = self._conn.execute(
+                "SELECT COUNT(*) FROM journal WHERE failed_at IS NOT NULL"
+            ).fetchone()[0]
+            last_seq = self._conn.execute(
+                "SELECT MAX(seq) FROM journal WHERE flushed_at IS NOT NULL"
+            ).fetchone()[0]
+
+        return {
+            "pending": pending,
+            "failed": failed,
+            "oldest_pending_age": round(time.time() - oldest, 3) if oldest else None,
+            "last_flushed_seq": last_seq,
+            "last_flush_at": self._last_flush_at,
+            "last_error": self._last_error,
+            "writer_running": bool(self._thread and self._thread.is_alive()),
+        }
+
+    def lookup(self, seq):
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT order_id, flushed_at, failed_at, last_error FROM journal WHERE seq = ?", (seq,)
+            ).fetchone()
+        if not row:
+            return None
+        order_id, flushed_at, failed_at, last_error = row
+        state = "flushed" if flushed_at else "failed" if failed_at else "pending"
+        return {"seq": seq, "state": state, "order_id": order_id, "error": last_error}
+
+    def failed(self, limit=100):
+        with self._lock:
+            rows = self._conn.execute("""
+                SELECT seq, payload, created_at, failed_at, attempts, last_error FROM journal
+                WHERE failed_at IS NOT NULL
+                ORDER BY seq ASC
+                LIMIT ?
+            """, (limit,)).fetchall()
+        return [
+            {
+                "seq": seq,
+                "order": json.loads(payload),
+                "created_at": created_at,
+                "failed_at": failed_at,
+                "attempts": attempts,
+                "error": last_error,
+            }
+            for seq, payload, created_at, failed_at, attempts, last_error in rows
+        ]
+
+    def retry(self, seq=None):
+        """Put failed entries (one, or all when seq is None) back in the
+        queue. Returns how many were requeued."""
+        with self._lock:
+            if seq is None:
+                cur = self._conn.execute("UPDATE journal SET failed_at = NULL WHERE failed_at IS NOT NULL")
+            else:
+                cur = self._conn.execute(
+                    "UPDATE journal SET failed_at = NULL WHERE seq = ? AND failed_at IS NOT NULL", (seq,)
+                )
+            count = cur.rowcount
+        if count:
+            self._wake.set()
+        return count
+
+    # ---------------- BACKGROUND WRITER ----------------
+    def start(self):
+        """Start the writer. Entries left unflushed by a previous run are
+        replayed first, in sequence order."""
+        if self._thread and self._thread.is_alive():
+            return
+        self._thread = threading.Thread(target=self._run, name="order-journal-writer", daemon=True)
+        self._thread.start()
+        self._wake.set()
+
+    def _pending(self):
+        with self._lock:
+            return self._conn.execute("""
+                SELECT seq, entry_id, payload FROM journal
+                WHERE flushed_at IS NULL AND failed_at IS NULL
+                ORDER BY seq ASC
+                LIMIT ?
+            """, (BATCH_SIZE,)).fetchall()
+
+    def _run(self):
+        pg = None
+        delay = RETRY_MIN
+        while True:
+            self._wake.wait(timeout=RETRY_MAX)
+            self._wake.clear()
+            try:
+                if pg is None or pg.closed:
+                    pg = get_connection()
+                    ensure_order_items_schema(pg)
+                    cur = pg.cursor()
+                    cur.execute(PG_SCHEMA)
+                    pg.commit()
+                    cur.close()
+
+                while True:
+                    batch = self._pending()
+                    if not batch:
+                        break
+                    self._flush(pg, batch)
+                delay = RETRY_MIN
+                self._last_error = None
+
+            except RETRYABLE as e:
+                # Postgres down, connection lost or schema missing: keep
+                # everything and retry on a fresh connection, which also
+                # creates the tables again
+                print("Order journal: Postgres unavailable, retrying in", delay, "s:", e)
+                self._last_error = str(e)
+                if pg is not None:
+                    pg.close()
+                pg = None
+                time.sleep(delay)
+                delay = min(delay * 2, RETRY_MAX)
+                self._wake.set()
+            except Exception as e:
+                # Drop the connection so a half-done transaction is never
+                # committed by the next attempt
+                print("Error in order journal writer:", e)
+                self._last_error = str(e)
+                if pg is not None:
+                    pg.close()
+                pg = None
+                time.sleep(delay)
+                delay = min(delay * 2, RETRY_MAX)
+                self._wake.set()
+
+    def _flush(self, pg, batch):
+        """Copy one batch to Postgres in a single transaction. If an entry is
+        rejected (by Postgres or while building its rows), the batch is retried
+        entry by entry so only the bad order is set aside."""
+        try:
+            applied = self._apply(pg, batch)
+        except RETRYABLE:
+            raise
+        except Exception as e:
+            pg.rollback()
+            if len(batch) == 1:
+                self._mark_failed(batch[0][0], e)
+                return
+            applied = []
+            for entry in batch:
+                try:
+                    applied += self._apply(pg, [entry])
+                except RETRYABLE:
+                    raise
+                except Exception as e:
+                    pg.rollback()
+                    self._mark_failed(entry[0], e)
+        self._mark_flushed(applied)
+
+    def _apply(self, pg, batch):
+        cur = pg.cursor()
+        applied = []
+        for seq, entry_id, payload in batch:
+            cur.execute(
+                "INSERT INTO order_journal_applied (entry_id) VALUES (%s) ON CONFLICT DO NOTHING RETURNING entry_id",
+                (entry_id,)
+            )
+            if cur.fetchone() is None:
+                # Already in Postgres from a run that crashed before marking it
+                cur.execute("SELECT order_id FROM order_journal_applied WHERE entry_id = %s", (entry_id,))
+                applied.append((seq, cur.fetchone()[0]))
+                continue
+
+            order_id = insert_order(cur, json.loads(payload))
+            cur.execute("UPDATE order_journal_applied SET order_id = %s WHERE entry_id = %s", (order_id, entry_id))
+            applied.append((seq, order_id))
+        pg.commit()
+        cur.close()
+        return applied
+
+    def _mark_flushed(self, applied):
+        now = time.time()
+        with self._lock:
+            self._conn.execute("BEGIN")
+            self._conn.executemany(
+                "UPDATE journal SET flushed_at = ?, order_id = ?, attempts = attempts + 1 WHERE seq = ?",
+                [(now, order_id, seq) for seq, order_id in applied]
+            )
+            self._conn.execute("COMMIT")
+        self._last_flush_at = now
+
+        if self.on_flushed:
+            for seq, order_id in applied:
+                self.on_flushed(seq, order_id)
+
+    def _mark_failed(self, seq, error):
+        print(f"Order journal: entry {seq} rejected:", error)
+        with self._lock:
+            self._conn.execute(
+                "UPDATE journal SET failed_at = ?, attempts = attempts + 1, last_error = ? WHERE seq = ?",
+                (time.time(), str(error), seq)
+            )
@@ -0,0 +1,334 @@
+import bisect
+import heapq
+import json
+import math
+import re
+import threading
+from db import get_connection
+
+# In-memory search over product names and categories for the cashier screen.
+# Every distinct word keeps its products sorted by name, and the words are
+# kept sorted too, so the words starting with a query term are one bisect
+# range and their products can be merged in name order, stopping once
+# `limit` results are found. Typos are handled per word: a word sharing most
+# of the term's front-padded trigrams ("  l", " la", "lat", ...) matches.
+MIN_MATCH = 0.6
+DEFAULT_LIMIT = 20
+MAX_LIMIT = 100
+# A prefix covering more words than this is walked over the name-ordered
+# catalog instead of merging that many postings; such prefixes match densely
+MAX_MERGE = 64
+# Shorter terms are only prefix-matched: with three trigrams or fewer, "most
+# trigrams" is just the first letters
+MIN_FUZZY_LENGTH = 4
+# Upper bound on the words checked for one typo-tolerant term
+MAX_FUZZY_CANDIDATES = 500
+# Products walked in name order, per `limit`, before a sparse query switches
+# to intersecting id sets
+WALK_BUDGET = 10
+
+_WORD = re.compile(r"[a-z0-9]+")
+
+
+def _words(text):
+    return _WORD.findall((text or "").lower())
+
+
+def _grams(word):
+    padded = "  " + word
+    return {padded[i:i + 3] for i in range(len(word))}
+
+
+def _append(items, item):
+    items.append(item)
+
+
+def _discard(items, item):
+    i = bisect.bisect_left(items, item)
+    if i < len(items) and items[i] == item:
+        del items[i]
+
+
+def row_to_product(r):
+    # Safely parse JSON fields if they're text
+    size = r[4]
+    addons = r[5]
+
+    # Handle cases where DB returns strings instead of dict/list
+    if isinstance(size, str):
+        try:
+            size = json.loads(size)
+        except ValueError:
+            pass
+
+    if isinstance(addons, str):
+        try:
+            addons = json.loads(addons)
+        except ValueError:
+            pass
+
+    return {
+        "id": r[0],
+        "name": r[1],
+        "category": r[2],
+        "image": r[3],
+        "size": size,
+        "addons": addons,
+    }
+
+
+def _fetch_products(where="", params=()):
+    conn = get_connection()
+    cur = conn.cursor()
+    cur.execute(f"SELECT id, name, category, image, size, addons FROM products {where} ORDER BY id ASC", params)
+    rows = cur.fetchall()
+    cur.close()
+    conn.close()
+    return rows
+
+
+class ProductIndex:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._loaded = False
+        self._clear()
+
+    def _clear(self):
+        self._products = {}
+        self._keys = {}           # id -> (lowercase name, id), the sort key
+        self._words = {}          # id -> words of the name and category
+        self._category_of = {}    # id -> lowercase category
+        self._order = []          # every sort key, sorted
+        self._by_category = {}    # lowercase category -> sorted sort keys
+        self._category_ids = {}   # lowercase category -> set of ids
+        self._vocab = []          # distinct words, sorted
+        self._postings = {}       # word -> sorted sort keys of its products
+        self._word_ids = {}       # word -> set of ids
+        self._word_grams = {}     # trigram -> words containing it
+
+    # ---------------- BUILD ----------------
+    # The lock is held across the database reads, so a product added while
+    # they run is applied after them instead of being overwritten or lost.
+    def load(self):
+        with self._lock:
+            self._load()
+
+    def ensure_loaded(self):
+        if self._loaded:
+            return
+        with self._lock:
+            if not self._loaded:
+                self._load()
+
+    def _load(self):
+        rows = _fetch_products()
+
+        # Append everything, then sort each list once
+        self._clear()
+        for r in rows:
+            self._add(row_to_product(r), insert=_append)
+        self._order.sort()
+        self._vocab.sort()
+        for keys in self._by_category.values():
+            keys.sort()
+        for keys in self._postings.values():
+            keys.sort()
+        self._loaded = True
+
+    def add(self, product):
+        with self._lock:
+            # Not loaded yet: the first load() reads the product from the database
+            if self._loaded:
+                self._remove(product["id"])
+                self._add(product)
+
+    def reload_category(self, *names):
+        """Re-read the products in the given categories, e.g. after a
+        category is renamed or deleted."""
+        lowered = [n.lower() for n in names if n]
+        with self._lock:
+            if not self._loaded:
+                return
+            rows = _fetch_products("WHERE LOWER(category) = ANY(%s)", (lowered,))
+            for name in lowered:
+                for _, product_id in list(self._by_category.get(name, ())):
+                    self._remove(product_id)
+            for r in rows:
+                self._add(row_to_product(r))
+
+    def _add(self, product, insert=bisect.insort):
+        product_id = product["id"]
+        key = ((product["name"] or "").lower(), product_id)
+        category = (product["category"] or "").lower()
+        words = set(_words(product["name"])) | set(_words(product["category"]))
+
+        self._products[product_id] = product
+        self._keys[product_id] = key
+        self._words[product_id] = words
+        self._category_of[product_id] = category
+        insert(self._order, key)
+        insert(self._by_category.setdefault(category, []), key)
+        self._category_ids.setdefault(category, set()).add(product_id)
+        for word in words:
+            postings = self._postings.get(word)
+            if postings is None:
+                postings = self._postings[word] = []
+                self._word_ids[word] = set()
+                insert(self._vocab, word)
+                for gram in _grams(word):
+                    self._word_grams.setdefault(gram, set()).add(word)
+            insert(postings, key)
+            self._word_ids[word].add(product_id)
+
+    def _remove(self, product_id):
+        product = self._products.pop(product_id, None)
+        if product is None:
+            return
+        key = self._keys.pop(product_id)
+        category = self._category_of.pop(product_id)
+
+        _discard(self._order, key)
+        _discard(self._by_category[category], key)
+        self._category_ids[category].discard(product_id)
+        if not self._by_category[category]:
+            del self._by_category[category]
+            del self._category_ids[category]
+        for word in self._words.pop(product_id):
+            postings = self._postings[word]
+            _discard(postings, key)
+            self._word_ids[word].discard(product_id)
+            if postings:
+                continue
+            del self._postings[word]
+            del self._word_ids[word]
+            _discard(self._vocab, word)
+            for gram in _grams(word):
+                self._word_grams[gram].discard(word)
+                if not self._word_grams[gram]:
+                    del self._word_grams[gram]
+
+    # ---------------- QUERY ----------------
+    def search(self, query, category=None, limit=DEFAULT_LIMIT):
+        """Products matching every query word, in name order: exact prefix
+        matches first, then typo-tolerant ones. The work done grows with
+        `limit`, not with the number of matching products."""
+        self.ensure_loaded()
+        terms = _words(query)
+
+        with self._lock:
+            category = category.lower() if category and category.lower() != "all" else None
+            catalog = self._order if category is None else self._by_category.get(category, [])
+            if not terms or not catalog:
+                return [self._products[product_id] for _, product_id in catalog[:limit]]
+
+            results = []
+            seen = set()
+            exact = [(term, self._prefix_words(term), frozenset()) for term in terms]
+            self._collect(exact, catalog, category, limit, results, seen)
+
+            if len(results) < limit:
+                fuzzy = []
+                for term, words, _ in exact:
+                    similar = self._similar_words(term)
+                    fuzzy.append((term, None if words is None else words + similar, frozenset(similar)))
+                if any(similar for _, _, similar in fuzzy):
+                    self._collect(fuzzy, catalog, category, limit, results, seen)
+
+            return [self._products[product_id] for product_id in results]
+
+    def _prefix_words(self, term):
+        """Words starting with `term`, or None if there are more than
+        MAX_MERGE of them."""
+        lo = bisect.bisect_left(self._vocab, term)
+        hi = bisect.bisect_left(self._vocab, term + "\x7f", lo)
+        if hi - lo > MAX_MERGE:
+            return None
+        return self._vocab[lo:hi]
+
+    def _similar_words(self, term):
+        """Words that don't start with `term` but share at least MIN_MATCH of
+        its trigrams."""
+        if len(term) < MIN_FUZZY_LENGTH:
+            return []
+        postings = sorted((self._word_grams.get(g, ()) for g in _grams(term)), key=len)
+        needed = math.ceil(len(postings) * MIN_MATCH)
+
+        # A word with `needed` of the n trigrams is in at least one of the
+        # n - needed + 1 smallest postings; very common trigrams are skipped
+        candidates = set()
+        for posting in postings[:len(postings) - needed + 1]:
+            if len(candidates) + len(posting) > MAX_FUZZY_CANDIDATES:
+                break
+            candidates.update(posting)
+
+        return [
+            word for word in candidates
+            if not word.startswith(term)
+            and sum(1 for posting in postings if word in posting) >= needed
+        ]
+
+    def _collect(self, matchers, catalog, category, limit, results, seen):
+        """Append matching product ids to `results` in name order until it
+        holds `limit`. Each matcher is (term, candidate words or None when
+        too common to merge, extra typo-tolerant words)."""
+        if any(words == [] for _, words, _ in matchers):
+            return
+        accepted = [None if words is None else set(words) for _, words, _ in matchers]
+
+        def matches(product_id):
+            words = self._words[product_id]
+            for (term, _, similar), accept in zip(matchers, accepted):
+                if accept is not None:
+                    if words.isdisjoint(accept):
+                        return False
+                elif not any(w.startswith(term) or w in similar for w in words):
+                    return False
+            return True
+
+        # Walk the postings of the term with the fewest products, or the
+        # name-ordered catalog (or category) when that is smaller or every
+        # term is a very broad prefix
+        keys = catalog
+        sizes = [
+            (sum(len(self._postings[w]) for w in words), words)
+            for _, words, _ in matchers if words is not None
+        ]
+        if sizes:
+            size, words = min(sizes, key=lambda item: item[0])
+            if size < len(catalog):
+                keys = heapq.merge(*(self._postings[w] for w in words))
+
+        # Dense matches fill `limit` within the budget. Sparse ones (rare
+        # word combinations, small categories) are finished with set
+        # intersections, which needs every term resolved to words.
+        budget = WALK_BUDGET * limit if None not in accepted else None
+        for steps, (_, product_id) in enumerate(keys):
+            if budget is not None and steps >= budget:
+                break
+            if product_id in seen:
+                continue
+            if category is not None and self._category_of[product_id] != category:
+                continue
+            if not matches(product_id):
+                continue
+            seen.add(product_id)
+            results.append(product_id)
+            if len(results) >= limit:
+                return
+        else:
+            return
+
+        # Intersect smallest first; a term spanning several words is narrowed
+        # word by word before the union so no large set is built
+        groups = [[self._word_ids[w] for w in words] for _, words, _ in matchers]
+        if category is not None:
+            groups.append([self._category_ids[category]])
+        groups.sort(key=lambda group: sum(map(len, group)))
+        ids = groups[0][0] if len(groups[0]) == 1 else set().union(*groups[0])
+        for group in groups[1:]:
+            ids = set().union(*(ids & word_ids for word_ids in group))
+        ids = ids - seen
+
+        for product_id in heapq.nsmallest(limit - len(results), ids, key=self._keys.__getitem__):
+            seen.add(product_id)
+            results.append(product_id)
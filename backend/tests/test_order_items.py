@@ -0,0 +1,160 @@
+import copy
+import json
+import psycopg2
+import pytest
+import order_items
+from order_items import backfill, insert_order_items
+
+
+class FakePostgres:
+    """Just enough of a psycopg2 connection for order_items: orders,
+    order_items and order_item_addons, with commit/rollback and savepoints."""
+
+    def __init__(self, orders=None):
+        self.committed = {"orders": dict(orders or {}), "lines": {}, "addons": []}
+        self.tx = copy.deepcopy(self.committed)
+        self.savepoint = None
+        self.commits = 0
+
+    def cursor(self):
+        return FakeCursor(self)
+
+    def commit(self):
+        self.committed = copy.deepcopy(self.tx)
+        self.commits += 1
+
+    def rollback(self):
+        self.tx = copy.deepcopy(self.committed)
+
+    def close(self):
+        pass
+
+
+class FakeCursor:
+    def __init__(self, pg):
+        self.pg = pg
+        self.rows = []
+
+    def execute(self, sql, params=None):
+        pg = self.pg
+        sql = sql.strip()
+        if sql.startswith("CREATE TABLE"):
+            return
+        if sql == "SAVEPOINT backfill_order":
+            pg.savepoint = copy.deepcopy(pg.tx)
+        elif sql == "RELEASE SAVEPOINT backfill_order":
+            pg.savepoint = None
+        elif sql == "ROLLBACK TO SAVEPOINT backfill_order":
+            pg.tx = pg.savepoint
+        elif sql.startswith("SELECT o.id, o.items FROM orders o"):
+            last_id, limit = params
+            done = {order_id for order_id, _ in pg.tx["lines"]}
+            pending = sorted(i for i in pg.tx["orders"] if i > last_id and i not in done)
+            self.rows = [(i, pg.tx["orders"][i]) for i in pending[:limit]]
+        else:
+            raise AssertionError(f"unexpected SQL: {sql}")
+
+    def execute_values(self, sql, rows, fetch):
+        # Stands in for psycopg2.extras.execute_values on this cursor
+        tx = self.pg.tx
+        if "INSERT INTO order_items" in sql:
+            inserted = []
+            for order_id, line_no, product_name, size, quantity, unit_price in rows:
+                if not isinstance(unit_price, (int, float)):
+                    raise psycopg2.DataError(f'invalid input syntax for type numeric: "{unit_price}"')
+                if (order_id, line_no) in tx["lines"]:
+                    continue
+                line_id = len(tx["lines"]) + 1
+                tx["lines"][(order_id, line_no)] = (line_id, product_name, size, quantity, unit_price)
+                inserted.append((line_id, line_no))
+            return inserted if fetch else None
+        if "INSERT INTO order_item_addons" in sql:
+            tx["addons"].extend(rows)
+            return None
+        raise AssertionError(f"unexpected SQL: {sql}")
+
+    def fetchall(self):
+        return self.rows
+
+    def close(self):
+        pass
+
+
+@pytest.fixture(autouse=True)
+def fake_execute_values(monkeypatch):
+    monkeypatch.setattr(
+        order_items, "execute_values",
+        lambda cur, sql, rows, fetch=False: cur.execute_values(sql, rows, fetch)
+    )
+
+
+def test_maps_cashier_columns():
+    pg = FakePostgres()
+    insert_order_items(pg.cursor(), 7, [
+        {"productName": "Latte", "size": "Large", "qty": 2, "price": 135, "addons": []},
+        {"name": "Mocha", "quantity": 3, "price": 120},
+        {"productName": "Tea"},
+    ])
+
+    assert pg.tx["lines"] == {
+        (7, 0): (1, "Latte", "Large", 2, 135),
+        (7, 1): (2, "Mocha", None, 3, 120),
+        (7, 2): (3, "Tea", None, 1, 0),
+    }
+
+
+def test_accepts_json_text_blob():
+    pg = FakePostgres()
+    insert_order_items(pg.cursor(), 1, json.dumps([{"productName": "Latte", "qty": 1, "price": 100}]))
+    assert pg.tx["lines"][(1, 0)] == (1, "Latte", None, 1, 100)
+
+
+def test_dict_and_string_addons():
+    pg = FakePostgres()
+    insert_order_items(pg.cursor(), 1, [{
+        "productName": "Latte", "qty": 1, "price": 100,
+        "addons": [{"id": 4, "name": "Oat milk", "price": 20}, "Extra shot", {"name": "Ice"}],
+    }])
+
+    assert pg.tx["addons"] == [(1, "Oat milk", 20), (1, "Extra shot", 0), (1, "Ice", 0)]
+
+
+def test_existing_lines_skip_their_addons():
+    pg = FakePostgres()
+    cur = pg.cursor()
+    first = {"productName": "Latte", "qty": 1, "price": 100, "addons": [{"name": "Oat milk", "price": 20}]}
+    insert_order_items(cur, 1, [first])
+
+    second = {"productName": "Mocha", "qty": 1, "price": 120, "addons": [{"name": "Whip", "price": 15}]}
+    insert_order_items(cur, 1, [first, second])
+
+    assert len(pg.tx["lines"]) == 2
+    assert pg.tx["addons"] == [(1, "Oat milk", 20), (2, "Whip", 15)]
+
+
+def test_backfill_skips_orders_that_already_have_lines(monkeypatch):
+    blob = json.dumps([{"productName": "Latte", "qty": 1, "price": 100}])
+    pg = FakePostgres({i: blob for i in range(1, 6)})
+    monkeypatch.setattr(order_items, "get_connection", lambda: pg)
+
+    assert backfill(chunk_size=2) == 5
+    assert sorted(order_id for order_id, _ in pg.committed["lines"]) == [1, 2, 3, 4, 5]
+
+    pg.committed["orders"][6] = blob
+    pg.tx = copy.deepcopy(pg.committed)
+    assert backfill(chunk_size=2) == 1
+    assert len(pg.committed["lines"]) == 6
+
+
+def test_backfill_skips_rows_postgres_rejects(monkeypatch):
+    good = json.dumps([{"productName": "Latte", "qty": 1, "price": 100, "addons": ["Oat milk"]}])
+    bad = json.dumps([
+        {"productName": "Mocha", "qty": 1, "price": 120},
+        {"productName": "Tea", "qty": 1, "price": "free"},
+    ])
+    pg = FakePostgres({1: good, 2: bad, 3: "not json", 4: good})
+    monkeypatch.setattr(order_items, "get_connection", lambda: pg)
+
+    assert backfill(chunk_size=10) == 2
+    assert sorted(order_id for order_id, _ in pg.committed["lines"]) == [1, 4]
+    assert len(pg.committed["addons"]) == 2
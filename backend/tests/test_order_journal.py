@@ -0,0 +1,295 @@
+import copy
+import os
+import time
+import psycopg2
+import psycopg2.errors
+import pytest
+import order_journal
+from order_journal import OrderJournal, validate_order
+
+
+class FakePostgres:
+    """Just enough of a psycopg2 connection for the journal writer: orders,
+    their lines and order_journal_applied, with commit/rollback."""
+
+    def __init__(self):
+        self.committed = {"orders": {}, "lines": [], "applied": {}}
+        self.tx = copy.deepcopy(self.committed)
+        self.closed = False
+        self.down = False
+        self.reject_total = None
+        self.tables = set()
+
+    def cursor(self):
+        return FakeCursor(self)
+
+    def commit(self):
+        self.committed = copy.deepcopy(self.tx)
+
+    def rollback(self):
+        self.tx = copy.deepcopy(self.committed)
+
+    def close(self):
+        self.closed = True
+
+
+class FakeCursor:
+    def __init__(self, pg):
+        self.pg = pg
+        self.result = None
+
+    def execute(self, sql, params=None):
+        if self.pg.down:
+            raise psycopg2.OperationalError("server closed the connection")
+        tx = self.pg.tx
+        if sql.strip().startswith("CREATE TABLE"):
+            self.pg.tables.update(t for t in ("order_items", "order_journal_applied") if t in sql)
+            self.result = None
+        elif "INSERT INTO order_journal_applied" in sql:
+            entry_id = params[0]
+            if entry_id in tx["applied"]:
+                self.result = None
+            else:
+                tx["applied"][entry_id] = None
+                self.result = (entry_id,)
+        elif "SELECT order_id FROM order_journal_applied" in sql:
+            self.result = (tx["applied"][params[0]],)
+        elif "UPDATE order_journal_applied" in sql:
+            tx["applied"][params[1]] = params[0]
+        elif "INSERT INTO orders" in sql:
+            if "order_items" not in self.pg.tables:
+                raise psycopg2.errors.UndefinedTable('relation "order_items" does not exist')
+            if params[3] == self.pg.reject_total:
+                raise psycopg2.DataError("numeric field overflow")
+            order_id = len(tx["orders"]) + 1
+            tx["orders"][order_id] = params
+            self.result = (order_id,)
+        else:
+            raise AssertionError(f"unexpected SQL: {sql}")
+
+    def fetchone(self):
+        return self.result
+
+    def close(self):
+        pass
+
+
+def fake_insert_order_items(cur, order_id, items):
+    # Mirrors the real helper: it calls item.get() on every line
+    for item in items:
+        cur.pg.tx["lines"].append((order_id, item.get("productName")))
+
+
+def order(n, **overrides):
+    data = {
+        "customerNumber": n,
+        "paymentMethod": "Cash",
+        "status": "Pending",
+        "totalAmount": 120,
+        "items": [{"productName": "Latte", "size": "Regular", "qty": 1, "price": 120, "addons": []}],
+    }
+    data.update(overrides)
+    return data
+
+
+def drain(journal, pg):
+    while True:
+        batch = journal._pending()
+        if not batch:
+            return
+        journal._flush(pg, batch)
+
+
+@pytest.fixture
+def pg(monkeypatch):
+    monkeypatch.setattr(order_journal, "insert_order_items", fake_insert_order_items)
+    pg = FakePostgres()
+    pg.tables.update({"order_items", "order_journal_applied"})
+    return pg
+
+
+@pytest.fixture
+def emitted():
+    return []
+
+
+@pytest.fixture
+def journal(tmp_path, emitted):
+    return OrderJournal(path=str(tmp_path / "journal.db"), on_flushed=lambda seq, order_id: emitted.append(seq))
+
+
+def test_flush_writes_orders_in_sequence(journal, pg, emitted):
+    for n in range(1, 4):
+        journal.append(order(n))
+
+    drain(journal, pg)
+
+    customers = [params[0] for params in pg.committed["orders"].values()]
+    assert customers == ["Customer #1", "Customer #2", "Customer #3"]
+    assert emitted == [1, 2, 3]
+    assert journal.status()["pending"] == 0
+    assert journal.lookup(2) == {"seq": 2, "state": "flushed", "order_id": 2, "error": None}
+
+
+def test_malformed_entry_is_isolated_and_not_half_written(journal, pg, emitted):
+    journal.append(order(1))
+    journal.append(order(2, items=["latte"]))
+    journal.append(order(3))
+
+    drain(journal, pg)
+
+    assert journal.lookup(2)["state"] == "failed"
+    assert journal.lookup(1)["state"] == journal.lookup(3)["state"] == "flushed"
+    assert emitted == [1, 3]
+    assert len(pg.committed["applied"]) == len(pg.committed["orders"]) == 2
+    assert all(order_id is not None for order_id in pg.committed["applied"].values())
+
+
+def test_postgres_rejection_is_isolated(journal, pg, emitted):
+    pg.reject_total = 999
+    journal.append(order(1))
+    journal.append(order(2, totalAmount=999))
+
+    drain(journal, pg)
+
+    assert journal.lookup(2)["state"] == "failed"
+    assert "overflow" in journal.lookup(2)["error"]
+    assert emitted == [1]
+
+
+def test_retry_requeues_failed_entries(journal, pg, emitted):
+    pg.reject_total = 999
+    journal.append(order(1, totalAmount=999))
+    drain(journal, pg)
+    assert [entry["seq"] for entry in journal.failed()] == [1]
+
+    pg.reject_total = None
+    assert journal.retry(1) == 1
+    assert journal.retry(1) == 0
+    drain(journal, pg)
+
+    assert journal.lookup(1)["state"] == "flushed"
+    assert journal.failed() == []
+    assert emitted == [1]
+
+
+def test_outage_keeps_entries_pending(journal, pg):
+    journal.append(order(1))
+    pg.down = True
+
+    with pytest.raises(psycopg2.OperationalError):
+        drain(journal, pg)
+
+    assert journal.lookup(1)["state"] == "pending"
+    assert journal.status()["failed"] == 0
+
+
+def test_replay_after_crash_does_not_duplicate(tmp_path, pg, emitted):
+    path = str(tmp_path / "journal.db")
+    first = OrderJournal(path=path)
+    first.append(order(1))
+    first.append(order(2))
+    # Crash after the Postgres commit but before the local "flushed" mark
+    first._apply(pg, first._pending())
+
+    second = OrderJournal(path=path, on_flushed=lambda seq, order_id: emitted.append(seq))
+    assert second.status()["pending"] == 2
+    drain(second, pg)
+
+    assert len(pg.committed["orders"]) == 2
+    assert second.lookup(1)["order_id"] == 1
+    assert second.lookup(2)["order_id"] == 2
+
+
+def test_new_journal_file_does_not_collide_with_applied_entries(tmp_path, pg, emitted):
+    first = OrderJournal(path=str(tmp_path / "a.db"))
+    first.append(order(1))
+    drain(first, pg)
+
+    # A redeployed or second instance starts again at seq 1
+    second = OrderJournal(path=str(tmp_path / "b.db"), on_flushed=lambda seq, order_id: emitted.append(order_id))
+    assert second.append(order(2)) == 1
+    drain(second, pg)
+
+    customers = [params[0] for params in pg.committed["orders"].values()]
+    assert customers == ["Customer #1", "Customer #2"]
+    assert second.lookup(1)["order_id"] == 2
+    assert emitted == [2]
+
+
+def test_missing_schema_keeps_entries_pending(journal, pg):
+    pg.tables.clear()
+    journal.append(order(1))
+
+    with pytest.raises(psycopg2.errors.UndefinedTable):
+        drain(journal, pg)
+
+    assert journal.lookup(1)["state"] == "pending"
+    assert journal.status()["failed"] == 0
+
+
+def test_writer_creates_schema_on_connect(journal, pg, emitted, monkeypatch):
+    # Postgres was down when app.py tried to create the tables
+    pg.tables.clear()
+    monkeypatch.setattr(order_journal, "get_connection", lambda: pg)
+    journal.append(order(1))
+    journal.start()
+
+    deadline = time.time() + 5
+    while journal.status()["pending"] and time.time() < deadline:
+        time.sleep(0.01)
+
+    assert journal.lookup(1)["state"] == "flushed"
+    assert {"order_items", "order_journal_applied"} <= pg.tables
+    assert emitted == [1]
+
+
+def test_default_path_is_next_to_the_module():
+    if "ORDER_JOURNAL_PATH" in os.environ:
+        pytest.skip("ORDER_JOURNAL_PATH overrides the default")
+    assert order_journal.JOURNAL_PATH == os.path.join(os.path.dirname(order_journal.__file__), "order_journal.db")
+
+
+def test_writer_recovers_from_outage(journal, pg, emitted, monkeypatch):
+    monkeypatch.setattr(order_journal, "RETRY_MIN", 0.01)
+    attempts = []
+
+    def get_connection():
+        attempts.append(1)
+        pg.closed = False
+        pg.down = len(attempts) == 1
+        return pg
+
+    monkeypatch.setattr(order_journal, "get_connection", get_connection)
+    journal.append(order(1))
+    journal.start()
+
+    deadline = time.time() + 5
+    while journal.status()["pending"] and time.time() < deadline:
+        time.sleep(0.01)
+
+    assert journal.lookup(1)["state"] == "flushed"
+    assert len(attempts) == 2
+    assert emitted == [1]
+
+
+@pytest.mark.parametrize("data, error", [
+    ({"items": []}, "Missing required fields"),
+    (order(1, totalAmount="abc"), "totalAmount"),
+    (order(1, items=[]), "items must be"),
+    (order(1, items=["latte"]), "items[0] must be an object"),
+    (order(1, items=[{"productName": "Latte", "qty": "2", "price": 120}]), "qty"),
+    (order(1, items=[{"productName": "Latte", "qty": 1, "price": "free"}]), "price"),
+    (order(1, items=[{"productName": "Latte", "qty": 1, "price": 1e12}]), "price"),
+    (order(1, items=[{"productName": "Latte", "qty": 1, "price": 1, "addons": ["oat"]}]), "addons"),
+])
+def test_validate_order_rejects(data, error):
+    assert error in validate_order(data)
+
+
+def test_validate_order_accepts_cashier_payload():
+    data = order(1, items=[{
+        "productName": "Latte", "size": "Large", "qty": 2, "price": "135.00",
+        "addons": [{"id": 3, "name": "Oat milk", "price": 20}],
+    }])
+    assert validate_order(data) is None
@@ -0,0 +1,219 @@
+import random
+import threading
+import time
+import pytest
+import product_search
+from product_search import ProductIndex, row_to_product
+
+CATALOG = [
+    (1, "Caramel Latte", "coffee", None, {"small": 120, "large": 150}, [{"name": "Oat milk", "price": 20}]),
+    (2, "Iced Latte", "coffee", None, {"small": 110}, []),
+    (3, "Matcha Latte", "tea", None, {"small": 130}, []),
+    (4, "Oat Milk Americano", "coffee", None, {"small": 100}, []),
+    (5, "Jasmine Tea", "tea", None, {"small": 90}, []),
+    (6, "Thai Milk Tea", "tea", None, {"small": 95}, []),
+]
+
+
+@pytest.fixture
+def db_rows(monkeypatch):
+    rows = list(CATALOG)
+
+    def fetch_products(where="", params=()):
+        if where:
+            names = params[0]
+            return [r for r in rows if r[2].lower() in names]
+        return list(rows)
+
+    monkeypatch.setattr(product_search, "_fetch_products", fetch_products)
+    return rows
+
+
+@pytest.fixture
+def index(db_rows):
+    index = ProductIndex()
+    index.load()
+    return index
+
+
+def names(products):
+    return [p["name"] for p in products]
+
+
+def test_prefix_match(index):
+    assert names(index.search("lat")) == ["Caramel Latte", "Iced Latte", "Matcha Latte"]
+    assert names(index.search("jas")) == ["Jasmine Tea"]
+
+
+def test_typo_tolerance(index):
+    assert names(index.search("carmel")) == ["Caramel Latte"]
+    assert names(index.search("amricano")) == ["Oat Milk Americano"]
+    assert index.search("xyz") == []
+
+
+def test_every_term_must_match(index):
+    assert names(index.search("caramel lat")) == ["Caramel Latte"]
+    assert names(index.search("milk tea")) == ["Thai Milk Tea"]
+
+
+def test_category_is_searchable_and_filterable(index):
+    assert names(index.search("tea")) == ["Jasmine Tea", "Matcha Latte", "Thai Milk Tea"]
+    assert names(index.search("milk", category="Tea")) == ["Thai Milk Tea"]
+    assert names(index.search("latte", category="all")) == ["Caramel Latte", "Iced Latte", "Matcha Latte"]
+    assert index.search("latte", category="pastry") == []
+
+
+def test_limit_and_empty_query(index):
+    assert names(index.search("lat", limit=2)) == ["Caramel Latte", "Iced Latte"]
+    assert names(index.search("", category="tea")) == ["Jasmine Tea", "Matcha Latte", "Thai Milk Tea"]
+
+
+def test_results_have_the_get_products_shape(index):
+    latte = index.search("caramel")[0]
+    assert latte == row_to_product(CATALOG[0])
+    assert latte["size"] == {"small": 120, "large": 150}
+
+
+def test_add_is_searchable_immediately(index):
+    index.add(row_to_product((7, "Salted Caramel", "coffee", None, '{"small": 140}', "[]")))
+    assert names(index.search("caram")) == ["Caramel Latte", "Salted Caramel"]
+    assert index.search("salted")[0]["size"] == {"small": 140}
+
+    # Re-adding the same id replaces the old entry
+    index.add(row_to_product((7, "Sea Salt Mocha", "coffee", None, "{}", "[]")))
+    assert names(index.search("caram")) == ["Caramel Latte"]
+    assert names(index.search("mocha")) == ["Sea Salt Mocha"]
+
+
+def test_reload_category(index, db_rows):
+    db_rows[4] = (5, "Jasmine Green Tea", "tea", None, {}, [])
+    del db_rows[5]
+
+    index.reload_category("tea")
+
+    assert names(index.search("green")) == ["Jasmine Green Tea"]
+    assert index.search("thai") == []
+    assert names(index.search("caramel")) == ["Caramel Latte"]
+
+
+def test_add_during_first_load_is_kept(db_rows, monkeypatch):
+    index = ProductIndex()
+    fetch_products = product_search._fetch_products
+    adder = []
+
+    def slow_fetch(where="", params=()):
+        rows = fetch_products(where, params)
+        # A product is inserted after the rows were read but before the load ends
+        thread = threading.Thread(
+            target=index.add, args=(row_to_product((8, "Hojicha Latte", "tea", None, {}, [])),)
+        )
+        thread.start()
+        adder.append(thread)
+        return rows
+
+    monkeypatch.setattr(product_search, "_fetch_products", slow_fetch)
+    index.load()
+    adder[0].join()
+
+    assert names(index.search("hojicha")) == ["Hojicha Latte"]
+
+
+MENU_WORDS = (
+    "latte mocha americano espresso cappuccino macchiato caramel vanilla hazelnut iced hot matcha "
+    "chai jasmine oolong thai milk tea oat almond soy brown sugar cold brew frappe cinnamon honey "
+    "lavender rose coconut pumpkin spice white dark chocolate peppermint salted cream cheese"
+).split()
+MENU_CATEGORIES = ["coffee", "tea", "frappe", "seasonal", "pastry", "milk tea", "non coffee", "specials"]
+
+
+def menu_rows(count, seed=1):
+    rng = random.Random(seed)
+    return [
+        (i, " ".join(rng.sample(MENU_WORDS, rng.randint(2, 4))).title() + f" {i}",
+         rng.choice(MENU_CATEGORIES), None, {}, [])
+        for i in range(count)
+    ]
+
+
+def reference_search(index, query, category=None, limit=20):
+    """Brute force over every product, using the index's own typo matching
+    for single words."""
+    terms = product_search._words(query)
+    products = sorted(index._products.values(), key=lambda p: (p["name"].lower(), p["id"]))
+    if category and category.lower() != "all":
+        products = [p for p in products if p["category"].lower() == category.lower()]
+    if not terms:
+        return products[:limit]
+
+    similar = {term: set(index._similar_words(term)) for term in terms}
+
+    def words(p):
+        return set(product_search._words(p["name"])) | set(product_search._words(p["category"]))
+
+    exact = [p for p in products if all(any(w.startswith(t) for w in words(p)) for t in terms)]
+    fuzzy = [
+        p for p in products
+        if p not in exact and all(any(w.startswith(t) or w in similar[t] for w in words(p)) for t in terms)
+    ]
+    return (exact + fuzzy)[:limit]
+
+
+@pytest.mark.parametrize("max_merge, walk_budget", [(64, 10), (1, 10), (64, 1), (1, 1)])
+def test_matches_brute_force(monkeypatch, max_merge, walk_budget):
+    # A small MAX_MERGE forces the catalog walk, a small WALK_BUDGET the set fallback
+    rows = menu_rows(1000)
+    monkeypatch.setattr(product_search, "_fetch_products", lambda where="", params=(): rows)
+    monkeypatch.setattr(product_search, "MAX_MERGE", max_merge)
+    monkeypatch.setattr(product_search, "WALK_BUDGET", walk_budget)
+    index = ProductIndex()
+    index.load()
+
+    queries = ["", "c", "ca", "lat", "latte", "carmel", "amricano", "iced carmel", "matcha lat",
+               "tea", "milk tea", "cho mint", "xyz", "42", "cinamon hon"]
+    for query in queries:
+        for category in (None, "tea", "Milk Tea", "pastry"):
+            expected = reference_search(index, query, category)
+            for limit in (1, 5, 20):
+                assert index.search(query, category=category, limit=limit) == expected[:limit], (query, category, limit)
+
+
+def test_incremental_updates_match_a_fresh_load(monkeypatch):
+    rows = menu_rows(500)
+    monkeypatch.setattr(product_search, "_fetch_products", lambda where="", params=(): rows)
+    index = ProductIndex()
+    index.load()
+
+    rng = random.Random(2)
+    for product_id in rng.sample(range(500), 100):
+        index.add(row_to_product((product_id, "Renamed " + rng.choice(MENU_WORDS), "seasonal", None, {}, [])))
+    for product_id in range(500, 550):
+        index.add(row_to_product((product_id, "New " + rng.choice(MENU_WORDS), "tea", None, {}, [])))
+
+    current = [(p["id"], p["name"], p["category"], None, {}, []) for p in index._products.values()]
+    monkeypatch.setattr(product_search, "_fetch_products", lambda where="", params=(): current)
+    fresh = ProductIndex()
+    fresh.load()
+
+    assert index._order == fresh._order
+    assert index._vocab == fresh._vocab
+    assert index._postings == fresh._postings
+    assert index._word_grams == fresh._word_grams
+    for query in ["renamed", "new lat", "seasonal", "carmel"]:
+        assert names(index.search(query, limit=50)) == names(fresh.search(query, limit=50))
+
+
+def test_lookup_latency_on_large_catalog(monkeypatch):
+    # Catches lookups that scale with the number of matches (tens of ms at
+    # this size). Typical times are well under 1 ms; the bound is loose so
+    # slow CI machines don't flake.
+    rows = menu_rows(50000)
+    monkeypatch.setattr(product_search, "_fetch_products", lambda where="", params=(): rows)
+    index = ProductIndex()
+    index.load()
+
+    for query in ["c", "ca", "lat", "carmel", "iced carmel", "matcha lat", "tea"]:
+        for category in (None, "tea"):
+            start = time.perf_counter()
+            for _ in range(20):
+                index.search(query, category=category, limit=20)
+            assert (time.perf_counter() - start) / 20 < 0.005, (query, category)
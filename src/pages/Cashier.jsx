@@ -1,4 +1,4 @@
-import { useState } from "react";
+import { useEffect, useState } from "react";
 import ProductCard from "../components/ProductCard";
 import { FaTrash, FaMinus, FaPlus } from "react-icons/fa";
 import axios from "axios";
@@ -17,7 +17,37 @@ export default function Cashier({ orders, setOrders, products, categories }) {
     const [paymentMethod, setPaymentMethod] = useState("");
 
     // ----------------- Filtering -----------------
-    const filteredProducts = products.filter((product) => {
+    const [searchResults, setSearchResults] = useState(null);
+
+    // Typed searches go to the backend index; an empty box shows the full list
+    useEffect(() => {
+        if (!search.trim()) {
+            setSearchResults(null);
+            return;
+        }
+
+        let cancelled = false;
+        const timer = setTimeout(async () => {
+            try {
+                const token = localStorage.getItem("token");
+                const res = await axios.get(`${API_URL}/api/products/search`, {
+                    params: { q: search, category, limit: 100 },
+                    headers: token ? { Authorization: `Bearer ${token}` } : {},
+                });
+                if (!cancelled) setSearchResults(res.data);
+            } catch (err) {
+                console.error("Product search failed:", err);
+                if (!cancelled) setSearchResults(null);
+            }
+        }, 150);
+
+        return () => {
+            cancelled = true;
+            clearTimeout(timer);
+        };
+    }, [search, category, API_URL]);
+
+    const filteredProducts = searchResults ?? products.filter((product) => {
         const matchesSearch = product.name.toLowerCase().includes(search.toLowerCase());
         const matchesCategory =
             category === "all" || product.category.toLowerCase() === category.toLowerCase();